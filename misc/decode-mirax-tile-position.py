@@ -1,6 +1,8 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
-import struct, sys, os
+import mmap
+import numpy as np
+import sys, os
 
 HEADER_SIZE = 296
 STRUCT_SIZE = 9
@@ -10,30 +12,28 @@ def is_correct_size(filename):
     return (filesize - HEADER_SIZE) % STRUCT_SIZE == 0
 
 
-def try_reading(f):
-    f.seek(HEADER_SIZE)
-
-    while True:
-        data = f.read(STRUCT_SIZE)
-        if len(data) == 0:
-            break
+RECORD = np.dtype([('x', '<i4'), ('y', '<i4'), ('zz', 'u1')])
 
-        unpacked = struct.unpack("<iiB", data)
-
-        x = int(unpacked[0]) / 256.0
-        y = int(unpacked[1]) / 256.0
-        zz = int(unpacked[2])
+def try_reading(f):
+    if os.fstat(f.fileno()).st_size <= HEADER_SIZE:
+        # no records, and mmap can't map an empty file
+        return
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arr = np.frombuffer(mm, dtype=RECORD, offset=HEADER_SIZE)
+    xs = arr['x'] * (1.0 / 256.0)
+    ys = arr['y'] * (1.0 / 256.0)
 
-        print '%25.8f %25.8f %10d' % (x, y, zz)
+    np.savetxt(sys.stdout, np.c_[xs, ys, arr['zz']],
+            fmt='%25.8f %25.8f %10d')
 
 
 
 
 for filename in sys.argv[1:]:
     if not is_correct_size(filename):
-        print "%s: file not of expected size" % (filename)
+        print("%s: file not of expected size" % (filename))
     else:
-        print filename
+        print(filename)
         f = open(filename, "rb")
         try:
             try_reading(f)
@@ -1,34 +1,27 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
-import struct, sys, os
+import numpy as np
+import sys, os
 
-f = open(sys.argv[1])
+f = open(sys.argv[1], "rb")
 
 HEADER_OFFSET = 37
 
 f.seek(HEADER_OFFSET)
 
 filesize = os.stat(sys.argv[1]).st_size
-num_items = (filesize - HEADER_OFFSET) / 4
+num_items = (filesize - HEADER_OFFSET) // 4
 
-values = []
 
+arr = np.fromfile(f, dtype='<i4')
+values = arr.tolist()
 
-def get_pointer(num):
-    ptr = (num - HEADER_OFFSET) / 4.0
-    if int(ptr) == ptr and ptr > 0 and ptr < num_items:
-        return int(ptr)
-    else:
-        return None
-
-
-try:
-    while True:
-        values.append(struct.unpack("<i", f.read(4))[0])
-except:
-    pass
-
-values = (values)
+# For each value, the index of the item it points to, or -1 if it isn't
+# a valid pointer
+rel = arr.astype(np.int64) - HEADER_OFFSET
+pointers = rel // 4
+pointers[(rel % 4 != 0) | (pointers <= 0) | (pointers >= num_items)] = -1
+pointers = pointers.tolist()
 seen = [False] * len(values)
 
 
@@ -60,8 +53,10 @@ while ptr is not None:
         continue
     elif value == 128:
         items = decode4s(values, ptr)
-        for z in items:
-            width = 216
-            print "%d %d" % (z % width, z / width)
+        width = 216
+        sys.stdout.writelines("%d %d\n" % (z % width, z // width)
+                for z in items)
         break
-    ptr = get_pointer(value)
+    ptr = pointers[ptr]
+    if ptr == -1:
+        ptr = None
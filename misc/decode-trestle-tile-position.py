@@ -1,39 +1,43 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
-import struct, sys, os
+import mmap, struct, sys, os
 
 
-def bin(s):
-    return "".join(map(lambda b: b if b=='1' else ".", list("%.8d" % (int(_bin(s))))))
-#    return "%.8d" % (int(_bin(s)))
+# Binary representation of each byte value, with zero bits shown as "."
+BIN = [format(b, '08b').replace('0', '.') for b in range(256)]
 
-def _bin(s):
-    return str(s) if s<=1 else _bin(s>>1) + str(s&1)
 
+RECORD = struct.Struct("<2i8B2i8B")
 
-f = open(sys.argv[1])
+INT_FORMAT = "%11.d." * 2
+HEX_FORMAT = "   " + "%3.2x" * 8
 
-i = 0
+f = open(sys.argv[1], "rb")
+if os.fstat(f.fileno()).st_size:
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+else:
+    # mmap can't map an empty file
+    mm = b""
 
-while True:
-    data = f.read(32)
-    if not data:
-        break
 
-    unpacked = struct.unpack("<2i8B2i8B", data)
+def format_records(mm):
+    i = 0
 
-    a0 = unpacked[0]
-    a1 = unpacked[1]
-    b0 = unpacked[10]
-    b1 = unpacked[11]
+    for off in range(0, len(mm) - RECORD.size + 1, RECORD.size):
+        unpacked = RECORD.unpack_from(mm, off)
 
-    d0 = unpacked[2:10]
-    d1 = unpacked[12:]
+        a0 = unpacked[0]
+        a1 = unpacked[1]
+        b0 = unpacked[10]
+        b1 = unpacked[11]
 
-    int_format = "%11.d."
-    hex_format = "   " + "%3.2x" * 8
-#    print "%12d:" % (i) + (int_format * 2) % (a0, a1) + hex_format % (d0) + (int_format * 2) % (b0, b1) + hex_format % (d1)
-    print "%12d:" % (i) + (int_format * 2) % (a0, a1) + "   " + "".join(map(bin, d0)) + (int_format * 2) % (b0, b1) + "   " + "".join(map(bin, d1))
+        d0 = unpacked[2:10]
+        d1 = unpacked[12:]
 
-    i = i + 1
+#        yield "%12d:" % (i) + INT_FORMAT % (a0, a1) + HEX_FORMAT % (d0) + INT_FORMAT % (b0, b1) + HEX_FORMAT % (d1) + "\n"
+        yield "%12d:" % (i) + INT_FORMAT % (a0, a1) + "   " + "".join([BIN[b] for b in d0]) + INT_FORMAT % (b0, b1) + "   " + "".join([BIN[b] for b in d1]) + "\n"
 
+        i = i + 1
+
+
+sys.stdout.writelines(format_records(mm))
@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 #
 # mosaic-coords - Small web viewer for finding an appropriate mosaic tile
 #
@@ -19,6 +19,7 @@
 #
 
 from flask import Flask, abort, make_response, render_template_string
+from functools import lru_cache
 from io import BytesIO
 import json
 from optparse import OptionParser
@@ -32,6 +33,7 @@ from openslide.deepzoom import DeepZoomGenerator
 
 DEEPZOOM_SLIDE = None
 DEBUG = False
+TILE_CACHE_SIZE = 512
 INDEX_TEMPLATE = '''
 <!doctype html>
 <title>{{ slide }}</title>
@@ -118,19 +120,20 @@ def load_slide():
         raise ValueError('No slide file specified')
     app.slide = OpenSlide(slidefile)
     app.dz = DeepZoomGenerator(app.slide)
-
-
-@app.route('/')
-def index():
-    return render_template_string(
-        app.config['INDEX_TEMPLATE'],
-        slide=os.path.basename(app.config['DEEPZOOM_SLIDE']),
+    app.index_context = dict(
+        slide=os.path.basename(slidefile),
         width=app.slide.dimensions[0],
         height=app.slide.dimensions[1],
         downsamples=json.dumps(app.slide.level_downsamples)
     )
 
 
+@app.route('/')
+def index():
+    return render_template_string(app.config['INDEX_TEMPLATE'],
+            **app.index_context)
+
+
 @app.route('/slide.dzi')
 def dzi():
     resp = make_response(app.dz.get_dzi('jpeg'))
@@ -138,17 +141,25 @@ def dzi():
     return resp
 
 
+@lru_cache(maxsize=TILE_CACHE_SIZE)
+def get_tile_jpeg(level, col, row):
+    tile = app.dz.get_tile(level, (col, row))
+    buf = BytesIO()
+    tile.save(buf, 'jpeg', quality=90, subsampling=2)
+    return buf.getvalue()
+
+
 @app.route('/slide_files/<int:level>/<int:col>_<int:row>.jpeg')
 def tile(level, col, row):
     try:
-        tile = app.dz.get_tile(level, (col, row))
+        data = get_tile_jpeg(level, col, row)
     except ValueError:
         # Invalid level or coordinates
         abort(404)
-    buf = BytesIO()
-    tile.save(buf, 'jpeg', quality=90)
-    resp = make_response(buf.getvalue())
+    resp = make_response(data)
     resp.mimetype = 'image/jpeg'
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 3600
     return resp
 
 
@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 #
 #  OpenSlide, a library for reading whole slide image files
 #
@@ -20,28 +20,86 @@
 #  <http://www.gnu.org/licenses/>.
 #
 
-from __future__ import division
-from ConfigParser import RawConfigParser, NoOptionError, Error as ConfigError
+from configparser import NoOptionError, NoSectionError, Error as ConfigError
 import io
+import mmap
+import numpy as np
 import os
-from StringIO import StringIO
 import struct
 import sys
 import zlib
 
+INT32 = struct.Struct('<i')
+HIER_PAGE = struct.Struct('<2i')
+HIER_ENTRY = struct.Struct('<4i')
+NONHIER_PAGE = struct.Struct('<7i')
+POSITION_ENTRY = np.dtype([('zz', 'u1'), ('x', '<i4'), ('y', '<i4')])
+
 class Reporter(object):
+    enabled = True
+
     def __init__(self, level=0):
         self._level = level
         self._indent = ' ' * level * 2
 
     def __call__(self, key, value):
-        print '%s%-30s %s' % (self._indent, key + ':', value)
+        print('%s%-30s %s' % (self._indent, key + ':', value))
 
     def child(self, desc):
-        print '%s%s:' % (self._indent, desc)
+        print('%s%s:' % (self._indent, desc))
         return type(self)(self._level + 1)
 
 
+class NullReporter(object):
+    # Discards all output
+    enabled = False
+
+    def __call__(self, key, value):
+        pass
+
+    def child(self, desc):
+        return self
+
+
+class Slidedat(object):
+    # Minimal single-pass INI parser supporting the subset of the
+    # RawConfigParser interface we need.  Option names are
+    # case-insensitive; section names are not.
+    def __init__(self, f):
+        self._sections = {}
+        options = None
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+            if line[0] == '[' and line[-1] == ']':
+                options = self._sections.setdefault(line[1:-1], {})
+                continue
+            key, sep, value = line.partition('=')
+            if not sep or options is None:
+                raise ConfigError('Couldn\'t parse line: %s' % line)
+            options[key.strip().lower()] = value.strip()
+
+    def options(self, section):
+        # Returns a dict mapping lowercased option names to values
+        try:
+            return self._sections[section]
+        except KeyError:
+            raise NoSectionError(section)
+
+    def get(self, section, option):
+        try:
+            return self.options(section)[option.lower()]
+        except KeyError:
+            raise NoOptionError(option, section)
+
+    def getint(self, section, option):
+        return int(self.get(section, option))
+
+    def getfloat(self, section, option):
+        return float(self.get(section, option))
+
+
 class SlidedatHierarchy(object):
     SECTION = 'HIERARCHICAL'
 
@@ -50,9 +108,10 @@ class SlidedatHierarchy(object):
         self._by_name = {}
         self._next_offset = 0
 
-        layers = dat.getint(self.SECTION, self.LAYER_COUNT_KEY)
+        options = dat.options(self.SECTION)
+        layers = int(options[self.LAYER_COUNT_KEY])
         for layer_id in range(layers):
-            layer = HierLayer(self, dat, layer_id)
+            layer = HierLayer(self, options, layer_id)
             self._by_id.append(layer)
             self._by_name[layer.name] = layer
 
@@ -68,33 +127,33 @@ class SlidedatHierarchy(object):
 
 
 class HierTree(SlidedatHierarchy):
-    LAYER_COUNT_KEY = 'HIER_COUNT'
-    LAYER_NAME_KEY = 'HIER_%d_NAME'
-    LAYER_SECTION_KEY = 'HIER_%d_SECTION'
-    LEVEL_COUNT_KEY = 'HIER_%d_COUNT'
-    LEVEL_NAME_KEY = 'HIER_%d_VAL_%d'
-    LEVEL_SECTION_KEY = 'HIER_%d_VAL_%d_SECTION'
+    LAYER_COUNT_KEY = 'hier_count'
+    LAYER_NAME_KEY = 'hier_%d_name'
+    LAYER_SECTION_KEY = 'hier_%d_section'
+    LEVEL_COUNT_KEY = 'hier_%d_count'
+    LEVEL_NAME_KEY = 'hier_%d_val_%d'
+    LEVEL_SECTION_KEY = 'hier_%d_val_%d_section'
 
 
 class NonHierTree(SlidedatHierarchy):
-    LAYER_COUNT_KEY = 'NONHIER_COUNT'
-    LAYER_NAME_KEY = 'NONHIER_%d_NAME'
-    LAYER_SECTION_KEY = 'NONHIER_%d_SECTION'
-    LEVEL_COUNT_KEY = 'NONHIER_%d_COUNT'
-    LEVEL_NAME_KEY = 'NONHIER_%d_VAL_%d'
-    LEVEL_SECTION_KEY = 'NONHIER_%d_VAL_%d_SECTION'
+    LAYER_COUNT_KEY = 'nonhier_count'
+    LAYER_NAME_KEY = 'nonhier_%d_name'
+    LAYER_SECTION_KEY = 'nonhier_%d_section'
+    LEVEL_COUNT_KEY = 'nonhier_%d_count'
+    LEVEL_NAME_KEY = 'nonhier_%d_val_%d'
+    LEVEL_SECTION_KEY = 'nonhier_%d_val_%d_section'
 
 
 class HierLayer(object):
-    def __init__(self, h, dat, layer_id):
-        self.name = dat.get(h.SECTION, h.LAYER_NAME_KEY % layer_id)
-        self.section = dat.get(h.SECTION, h.LAYER_SECTION_KEY % layer_id)
-        self.levels = dat.getint(h.SECTION, h.LEVEL_COUNT_KEY % layer_id)
+    def __init__(self, h, options, layer_id):
+        self.name = options[h.LAYER_NAME_KEY % layer_id]
+        self.section = options[h.LAYER_SECTION_KEY % layer_id]
+        self.levels = int(options[h.LEVEL_COUNT_KEY % layer_id])
 
         self._by_id = []
         self._by_name = {}
         for level_id in range(self.levels):
-            level = HierLevel(h, dat, layer_id, level_id)
+            level = HierLevel(h, options, layer_id, level_id)
             self._by_id.append(level)
             self._by_name[level.name] = level
 
@@ -109,11 +168,9 @@ class HierLayer(object):
 
 
 class HierLevel(object):
-    def __init__(self, h, dat, layer_id, level_id):
-        self.name = dat.get(h.SECTION,
-                h.LEVEL_NAME_KEY % (layer_id, level_id))
-        self.section = dat.get(h.SECTION,
-                h.LEVEL_SECTION_KEY % (layer_id, level_id))
+    def __init__(self, h, options, layer_id, level_id):
+        self.name = options[h.LEVEL_NAME_KEY % (layer_id, level_id)]
+        self.section = options[h.LEVEL_SECTION_KEY % (layer_id, level_id)]
         self.offset = h.next_offset()
 
 
@@ -137,90 +194,81 @@ def read_len(f, size):
     return ret
 
 
-def read_int32(f):
-    buf = f.read(4)
-    assert(len(buf) == 4)
-    return struct.unpack('<i', buf)[0]
+def read_int32(buf, pos):
+    return INT32.unpack_from(buf, pos)[0]
 
 
-def assert_int32(f, value):
-    v = read_int32(f)
+def assert_int32(buf, pos, value):
+    v = read_int32(buf, pos)
     assert(v == value)
 
 
-def read_nonhier_record(r, datafiles, f, root_position, record):
+def read_nonhier_record(r, datafile_names, index, root_position, record):
     r('Nonhier record', record)
-    f.seek(root_position)
+    table_base = read_int32(index, root_position)
     # seek to record
-    table_base = read_int32(f)
-    f.seek(table_base + record * 4)
+    list_head = read_int32(index, table_base + record * 4)
     # seek to list head
-    list_head = read_int32(f)
-    f.seek(list_head)
-    # seek to data page
-    pagesize = read_int32(f)
+    pagesize = read_int32(index, list_head)
     if pagesize == 0x302e3130:
         # Magic constant indicating an empty section
         r('File', 'None')
         return
     else:
         assert(pagesize == 0)
-    page = read_int32(f)
-    f.seek(page)
-    # check pagesize
-    assert_int32(f, 1)
-    # read rest of prologue
-    read_int32(f)
-    assert_int32(f, 0)
-    assert_int32(f, 0)
-    # read actual data
-    position = read_int32(f)
-    size = read_int32(f)
-    fileno = read_int32(f)
-    r('File', os.path.basename(datafiles[fileno]))
+    # seek to data page
+    page = read_int32(index, list_head + 4)
+    # check pagesize, read rest of prologue, read actual data
+    pagesize, _, zero1, zero2, position, size, fileno = \
+            NONHIER_PAGE.unpack_from(index, page)
+    assert(pagesize == 1)
+    assert(zero1 == 0)
+    assert(zero2 == 0)
+    r('File', datafile_names[fileno])
     r('Position', position)
     r('Length', size)
     return (fileno, position, size)
 
 
-def read_hier_record(r, f, root_position, datafiles, record, images_x):
+def read_hier_record(r, index, root_position, datafile_names, record,
+        images_x):
     # find start of hier table
-    f.seek(root_position)
+    table_base = read_int32(index, root_position)
     # seek to record
-    table_base = read_int32(f)
-    f.seek(table_base + record * 4)
-    # seek to list head
-    list_head = read_int32(f)
-    f.seek(list_head)
-    # get offset of first data page
-    assert_int32(f, 0)
-    data_page = read_int32(f)
+    list_head = read_int32(index, table_base + record * 4)
+    # seek to list head, get offset of first data page
+    assert_int32(index, list_head, 0)
+    data_page = read_int32(index, list_head + 4)
     # read data pages
     while data_page != 0:
-        f.seek(data_page)
-        entries = read_int32(f)
-        data_page = read_int32(f)
-        for i in range(entries):
-            image_index = read_int32(f)
-            position = read_int32(f)
-            size = read_int32(f)
-            fileno = read_int32(f)
-            r('Image %5d x %5d' % (image_index % images_x,
-                    image_index // images_x), '%s %10d + %10d' % (
-                    os.path.basename(datafiles[fileno]), position, size))
+        entries, next_page = HIER_PAGE.unpack_from(index, data_page)
+        start = data_page + HIER_PAGE.size
+        end = start + HIER_ENTRY.size * entries
+        assert(end <= len(index))
+        # Skip formatting output that will be discarded
+        if getattr(r, 'enabled', True):
+            for image_index, position, size, fileno in \
+                    HIER_ENTRY.iter_unpack(index[start:end]):
+                r('Image %5d x %5d' % (image_index % images_x,
+                        image_index // images_x), '%s %10d + %10d' % (
+                        datafile_names[fileno], position, size))
+        data_page = next_page
 
 
 def read_slide_position_map(r, image_divisions, images_x, f, len):
-    assert(len % 9 == 0)
+    assert(len % POSITION_ENTRY.itemsize == 0)
     positions_x = images_x // image_divisions
-    for i in range(len // 9):
-        zz = struct.unpack('B', read_len(f, 1))[0]
-        x = read_int32(f)
-        y = read_int32(f)
-        if x != 0 or y != 0 or zz != 0:
-            r('Image %5d x %5d' % ((i % positions_x) * image_divisions,
-                    (i // positions_x) * image_divisions),
-                    '%8d x %8d  (%3d)' % (x, y, zz))
+    buf = read_len(f, len)
+    # Skip formatting output that will be discarded
+    if not getattr(r, 'enabled', True):
+        return
+    positions = np.frombuffer(buf, dtype=POSITION_ENTRY)
+    valid = np.flatnonzero((positions['x'] != 0) | (positions['y'] != 0) |
+            (positions['zz'] != 0))
+    for i, (zz, x, y) in zip(valid.tolist(), positions[valid].tolist()):
+        r('Image %5d x %5d' % ((i % positions_x) * image_divisions,
+                (i // positions_x) * image_divisions),
+                '%8d x %8d  (%3d)' % (x, y, zz))
 
 
 def dump_mirax(path, r=None):
@@ -233,8 +281,7 @@ def dump_mirax(path, r=None):
 
     # Start parsing slidedat
     f = io.open(os.path.join(dirname, 'Slidedat.ini'), encoding='utf-8-sig')
-    dat = RawConfigParser()
-    dat.readfp(f)
+    dat = Slidedat(f)
     images_x = dat.getint('GENERAL', 'IMAGENUMBER_X')
     images_y = dat.getint('GENERAL', 'IMAGENUMBER_Y')
     slide_id = dat.get('GENERAL', 'SLIDE_ID')
@@ -248,6 +295,7 @@ def dump_mirax(path, r=None):
         image_divisions = 1
     datafiles = [os.path.join(dirname, dat.get('DATAFILE', 'FILE_%d' % i))
             for i in range(dat.getint('DATAFILE', 'FILE_COUNT'))]
+    datafile_names = [os.path.basename(p) for p in datafiles]
     r('Slide version', dat.get('GENERAL', 'SLIDE_VERSION'))
     r('Slide ID', slide_id)
     r('Slide type', slide_type)
@@ -299,10 +347,14 @@ def dump_mirax(path, r=None):
             pass
 
     # Start parsing index.dat
-    index = open(os.path.join(dirname, dat.get('HIERARCHICAL', 'INDEXFILE')))
-    index_version = read_len(index, 5)
-    index_id = read_len(index, len(slide_id))
-    hier_root = index.tell()
+    with open(os.path.join(dirname, dat.get('HIERARCHICAL', 'INDEXFILE')),
+            'rb') as fh:
+        index = memoryview(mmap.mmap(fh.fileno(), 0,
+                access=mmap.ACCESS_READ))
+    hier_root = 5 + len(slide_id)
+    assert(hier_root <= len(index))
+    index_version = index[:5].tobytes().decode()
+    index_id = index[5:hier_root].tobytes().decode()
     nonhier_root = hier_root + 4
     r('Index version', index_version)
     r('Index ID', index_id)
@@ -312,7 +364,7 @@ def dump_mirax(path, r=None):
     for associated in 'macro', 'label', 'thumbnail':
         if associated in nonhier_offsets:
             rrr = rr.child(associated)
-            read_nonhier_record(rrr, datafiles, index, nonhier_root,
+            read_nonhier_record(rrr, datafile_names, index, nonhier_root,
                     nonhier_offsets[associated])
             rrr('Format', associated_image_formats[associated])
 
@@ -327,23 +379,28 @@ def dump_mirax(path, r=None):
     for layer in nonhier_tree:
         rrr = rr.child(layer.name)
         for level in layer:
-            read_nonhier_record(rrr.child(level.name), datafiles, index,
-                    nonhier_root, level.offset)
+            read_nonhier_record(rrr.child(level.name), datafile_names,
+                    index, nonhier_root, level.offset)
 
     # Print slide position map
     position_keys = set(['index', 'zindex']) & set(nonhier_offsets)
     if position_keys:
         for key in position_keys:
             rr = r.child('Slide positions')
-            fileno, position, size = read_nonhier_record(rr, datafiles, index,
-                    nonhier_root, nonhier_offsets[key])
-            f = open(datafiles[fileno])
-            f.seek(position)
-            if key == 'zindex':
-                buf = zlib.decompress(f.read(size))
-                f = StringIO(buf)
-                size = len(buf)
-            read_slide_position_map(rr, image_divisions, images_x, f, size)
+            fileno, position, size = read_nonhier_record(rr,
+                    datafile_names, index, nonhier_root, nonhier_offsets[key])
+            with open(datafiles[fileno], 'rb') as f:
+                if hasattr(os, 'posix_fadvise'):
+                    # Start readahead of the whole map
+                    os.posix_fadvise(f.fileno(), position, size,
+                            os.POSIX_FADV_WILLNEED)
+                f.seek(position)
+                if key == 'zindex':
+                    buf = zlib.decompress(f.read(size))
+                    f = io.BytesIO(buf)
+                    size = len(buf)
+                read_slide_position_map(rr, image_divisions, images_x, f,
+                        size)
     else:
         r('Slide positions', 'None')
 
@@ -351,7 +408,7 @@ def dump_mirax(path, r=None):
     rr = r.child('Images')
     for level in range(slide_zoom_layer.levels):
         read_hier_record(rr.child('Level %d' % level), index, hier_root,
-                datafiles, level, images_x)
+                datafile_names, level, images_x)
 
 
 if __name__ == '__main__':
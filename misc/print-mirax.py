@@ -1,41 +1,46 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
-import struct, sys, os
+import numpy as np
+import sys, os
 
-f = open(sys.argv[1])
+f = open(sys.argv[1], "rb")
 
 HEADER_OFFSET = 37
 
 f.seek(HEADER_OFFSET)
 
 filesize = os.stat(sys.argv[1]).st_size
-num_items = (filesize - HEADER_OFFSET) / 4
+num_items = max((filesize - HEADER_OFFSET) // 4, 0)
 
-num_skipped = 0
-i = 0
+values = np.fromfile(f, dtype='<i4', count=num_items).astype(np.int64)
 
-try:
-    while True:
-        n = struct.unpack("<i", f.read(4))[0]
-        possible_lineno = (n - HEADER_OFFSET) / 4.0
+# Check all values for plausible item pointers at once
+offsets = values - HEADER_OFFSET
+possible_linenos = offsets >> 2
+valid = (offsets >= 0) & (offsets & 3 == 0) & (possible_linenos < num_items)
+deltas = possible_linenos - np.arange(len(values))
 
-        if possible_lineno < 0 or possible_lineno >= num_items \
-                or int(possible_lineno) != possible_lineno:
+
+def format_lines():
+    num_skipped = 0
+
+    for i, (n, ok, possible_lineno, delta) in enumerate(zip(values.tolist(),
+            valid.tolist(), possible_linenos.tolist(), deltas.tolist())):
+        if not ok:
             s = "%7d %11d" % (i, n)
         else:
             s = "%7d %11d %10d    -> %10s" % (i, n, possible_lineno, \
-                                                  "%+d" % (possible_lineno-i))
-
-        i = i+1
+                                                  "%+d" % delta)
 
 #        if n == 0:
 #            num_skipped = num_skipped + 1
 #            continue
 
         if num_skipped > 0:
-            print '%7s %11s %10s %30d' % ('.','.','.', num_skipped)
+            yield '%7s %11s %10s %30d\n' % ('.','.','.', num_skipped)
             num_skipped = 0
 
-        print s
-except:
-    pass
+        yield s + '\n'
+
+
+sys.stdout.writelines(format_lines())
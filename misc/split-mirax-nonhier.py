@@ -1,23 +1,53 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
+import numpy as np
 import struct, sys, os
 
 
+INT32 = struct.Struct("<i")
+
+
 def rr(f):
-    return struct.unpack("<i", f.read(4))[0]
+    return INT32.unpack(f.read(4))[0]
+
+
+def get_datafile(fileno):
+    try:
+        return datafiles[fileno]
+    except KeyError:
+        ff = open(os.path.join(dir, "Data%0.4d.dat" % (fileno)), "rb")
+        datafiles[fileno] = ff
+        return ff
+
+
+def copy_data(fileno, offset, length, outfilename):
+    # copy directly between files in the kernel
+    in_fd = get_datafile(fileno).fileno()
+    out_fd = os.open(outfilename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+            0o666)
+    try:
+        while length > 0:
+            sent = os.sendfile(out_fd, in_fd, offset, length)
+            if sent == 0:
+                break
+            offset += sent
+            length -= sent
+    finally:
+        os.close(out_fd)
 
 
 filename = sys.argv[1]
 
-f = open(filename)
+f = open(filename, "rb")
 dir = os.path.dirname(filename)
+datafiles = {}
 
 HEADER_OFFSET = 37
 
 f.seek(HEADER_OFFSET + 4)
 
 filesize = os.stat(sys.argv[1]).st_size
-num_items = (filesize - HEADER_OFFSET) / 4
+num_items = (filesize - HEADER_OFFSET) // 4
 
 # read first pointer
 top = rr(f)
@@ -40,12 +70,12 @@ while True:
     table.append(ptr)
 
 
-print "table: " + str(table)
+print("table: " + str(table))
 
 
 # read each item
 for ptr in table:
-    print ptr
+    print(ptr)
     f.seek(ptr)
     rr(f)  # 0
     newptr = rr(f)
@@ -58,27 +88,19 @@ for ptr in table:
         pages = rr(f)
         nextptr = rr(f)
 
-        while pages != 0:
-            rr(f) # 0
-            rr(f) # 0
-            fileoffset = rr(f)
-            filelen = rr(f)
-            fileno = rr(f)
-
-            pages = pages - 1
+        # read all entries: 0, 0, fileoffset, filelen, fileno
+        entries = np.frombuffer(f.read(pages * 5 * 4), dtype='<i4')
+        entries = entries.reshape(pages, 5)
+        # group reads by data file
+        entries = entries[np.argsort(entries[:, 4], kind='stable')]
 
-            # open file and get data
-            filename = os.path.join(dir, "Data%0.4d.dat" % (fileno))
-            ff = open(filename)
-            ff.seek(fileoffset)
-            data = ff.read(filelen)
-            ff.close()
-
-            # write it
+        for _, _, fileoffset, filelen, fileno in entries.tolist():
+            # copy data
             outfilename = "Data%0.4d_noheader.dat" % (fileno)
-            of = open(outfilename, "w")
-            of.write(data)
-            of.close()
+            copy_data(fileno, fileoffset, filelen, outfilename)
 
         if nextptr == 0:
             break
+
+for ff in datafiles.values():
+    ff.close()
@@ -1,23 +1,68 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
 import struct, sys, os
 
 
+INT32 = struct.Struct("<i")
+
+# merge tile reads separated by at most this many bytes
+MERGE_GAP = 64 << 10
+# but don't read more than this at once
+MAX_READ = 64 << 20
+
+
 def rr(f):
-    return struct.unpack("<i", f.read(4))[0]
+    return INT32.unpack(f.read(4))[0]
+
+
+def get_datafile(fileno):
+    try:
+        return datafiles[fileno]
+    except KeyError:
+        ff = open(os.path.join(dir, "Data%0.4d.dat" % (fileno)), "rb")
+        datafiles[fileno] = ff
+        return ff
+
+
+def copy_tiles(tiles):
+    # read tiles in file order, coalescing nearby tiles into one read
+    entries = sorted((fileno, offset, length, outfilename)
+            for outfilename, (fileno, offset, length) in tiles.items())
+    i = 0
+    while i < len(entries):
+        fileno, start, length, _ = entries[i]
+        end = start + length
+        j = i + 1
+        while j < len(entries):
+            next_fileno, offset, length, _ = entries[j]
+            if (next_fileno != fileno or offset > end + MERGE_GAP or
+                    max(end, offset + length) - start > MAX_READ):
+                break
+            end = max(end, offset + length)
+            j += 1
+
+        fd = get_datafile(fileno).fileno()
+        buf = memoryview(os.pread(fd, end - start, start))
+        for _, offset, length, outfilename in entries[i:j]:
+            with open(outfilename, "wb") as out:
+                out.write(buf[offset - start:offset - start + length])
+        i = j
 
 
 filename = sys.argv[1]
 
-f = open(filename)
+f = open(filename, "rb")
 dir = os.path.dirname(filename)
+datafiles = {}
+# output filename -> (fileno, offset, length)
+tiles = {}
 
 HEADER_OFFSET = 37
 
 f.seek(HEADER_OFFSET)
 
 filesize = os.stat(sys.argv[1]).st_size
-num_items = (filesize - HEADER_OFFSET) / 4
+num_items = (filesize - HEADER_OFFSET) // 4
 
 # read first pointer
 top = rr(f)
@@ -36,12 +81,12 @@ while True:
     table.append(ptr)
 
 
-print "table: " + str(table)
+print("table: " + str(table))
 
 
 # read each item
 for ptr in table:
-    print ptr
+    print(ptr)
     f.seek(ptr)
     rr(f)  # 0
     newptr = rr(f)
@@ -49,31 +94,30 @@ for ptr in table:
     # seek
     f.seek(newptr)
 
-    while True:
-        # read page stuff
-        pages = rr(f)
-        nextptr = rr(f)
-
-        while pages != 0:
-            tileno = rr(f)
-            fileoffset = rr(f)
-            filelen = rr(f)
-            fileno = rr(f)
-
-            pages = pages - 1
-
-            # open file and get data
-            filename = os.path.join(dir, "Data%0.4d.dat" % (fileno))
-            ff = open(filename)
-            ff.seek(fileoffset)
-            data = ff.read(filelen)
-            ff.close()
-
-            # write it
-            outfilename = "Data%0.4d_%0.10d.jpg" % (fileno, tileno)
-            of = open(outfilename, "w")
-            of.write(data)
-            of.close()
-
-        if nextptr == 0:
-            break
+    try:
+        while True:
+            # read page stuff
+            pages = rr(f)
+            nextptr = rr(f)
+
+            while pages != 0:
+                tileno = rr(f)
+                fileoffset = rr(f)
+                filelen = rr(f)
+                fileno = rr(f)
+
+                pages = pages - 1
+
+                # queue data; a later tile with the same name replaces it
+                outfilename = "Data%0.4d_%0.10d.jpg" % (fileno, tileno)
+                tiles[outfilename] = (fileno, fileoffset, filelen)
+
+            if nextptr == 0:
+                break
+    finally:
+        # write this item's tiles, even if the index is truncated
+        copy_tiles(tiles)
+        tiles.clear()
+
+for ff in datafiles.values():
+    ff.close()
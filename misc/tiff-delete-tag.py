@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 #
 #  Delete one tag from a TIFF file.
 #
@@ -19,29 +19,39 @@
 #  <http://www.gnu.org/licenses/>.
 #
 
+import io
+import mmap
 from optparse import OptionParser
-import string
 import struct
 import sys
 
-class TiffFile(file):
+class TiffFile(io.BufferedRandom):
+    # Format strings can have special characters:
+    # y: 16-bit   signed on little TIFF, 64-bit   signed on BigTIFF
+    # Y: 16-bit unsigned on little TIFF, 64-bit unsigned on BigTIFF
+    # z: 32-bit   signed on little TIFF, 64-bit   signed on BigTIFF
+    # Z: 32-bit unsigned on little TIFF, 64-bit unsigned on BigTIFF
+    _LITTLE_TIFF_FORMATS = str.maketrans('yYzZ', 'hHiI')
+    _BIGTIFF_FORMATS = str.maketrans('yYzZ', 'qQqQ')
+
     def __init__(self, path):
-        file.__init__(self, path, 'r+b')
+        io.BufferedRandom.__init__(self, io.FileIO(path, 'r+b'))
+        self._structs = {}
         # Check header, decide endianness
         endian = self.read(2)
-        if endian == 'II':
+        if endian == b'II':
             self._fmt_prefix = '<'
-        elif endian == 'MM':
+        elif endian == b'MM':
             self._fmt_prefix = '>'
         else:
             raise IOError('Not a TIFF file')
         # Check TIFF version
-        self._bigtiff = False
+        self._format_table = self._LITTLE_TIFF_FORMATS
         version = self.read_fmt('H')
         if version == 42:
             pass
         elif version == 43:
-            self._bigtiff = True
+            self._format_table = self._BIGTIFF_FORMATS
             magic2, reserved = self.read_fmt('HH')
             if magic2 != 8 or reserved != 0:
                 raise IOError('Bad BigTIFF header')
@@ -50,31 +60,35 @@ class TiffFile(file):
         # Leave file offset at pointer to first directory
 
     def _convert_format(self, fmt):
-        # Format strings can have special characters:
-        # y: 16-bit   signed on little TIFF, 64-bit   signed on BigTIFF
-        # Y: 16-bit unsigned on little TIFF, 64-bit unsigned on BigTIFF
-        # z: 32-bit   signed on little TIFF, 64-bit   signed on BigTIFF
-        # Z: 32-bit unsigned on little TIFF, 64-bit unsigned on BigTIFF
-        if self._bigtiff:
-            fmt = fmt.translate(string.maketrans('yYzZ', 'qQqQ'))
-        else:
-            fmt = fmt.translate(string.maketrans('yYzZ', 'hHiI'))
-        return self._fmt_prefix + fmt
+        return self._fmt_prefix + fmt.translate(self._format_table)
+
+    def _get_struct(self, fmt):
+        try:
+            return self._structs[fmt]
+        except KeyError:
+            s = self._structs[fmt] = struct.Struct(self._convert_format(fmt))
+            return s
 
     def fmt_size(self, fmt):
-        return struct.calcsize(self._convert_format(fmt))
+        return self._get_struct(fmt).size
 
     def read_fmt(self, fmt):
-        fmt = self._convert_format(fmt)
-        vals = struct.unpack(fmt, self.read(struct.calcsize(fmt)))
+        s = self._get_struct(fmt)
+        vals = s.unpack(self.read(s.size))
         if len(vals) == 1:
             return vals[0]
         else:
             return vals
 
-    def write_fmt(self, fmt, *args):
-        fmt = self._convert_format(fmt)
-        self.write(struct.pack(fmt, *args))
+    def unpack_fmt_from(self, fmt, buf, offset):
+        vals = self._get_struct(fmt).unpack_from(buf, offset)
+        if len(vals) == 1:
+            return vals[0]
+        else:
+            return vals
+
+    def pack_fmt_into(self, fmt, buf, offset, *args):
+        self._get_struct(fmt).pack_into(buf, offset, *args)
 
 
 # Parse command line
@@ -108,19 +122,37 @@ with TiffFile(filename) as fh:
 
     # Find the desired tag
     tag_count = fh.read_fmt('Y')
-    tags_remaining = tag_count
-    while tags_remaining > 0:
-        pos = fh.tell()
-        cur_tag, _type, _count, _value = fh.read_fmt('HHZZ')
-        tags_remaining -= 1
-        if cur_tag == tag:
-            # Delete it.  Always copy the next-IFD offset as a 64-bit value
-            # to support NDPI.
-            buf = fh.read(entry_size * tags_remaining + fh.fmt_size('Q'))
-            fh.seek(pos)
-            fh.write(buf)
-            fh.seek(dir_base)
-            fh.write_fmt('Y', tag_count - 1)
-            break
-    else:
-        raise IOError('No such tag')
+    entries_base = fh.tell()
+    # Read the whole directory at once.  Always include the next-IFD
+    # offset as a 64-bit value to support NDPI.
+    entries_size = entry_size * tag_count
+    buf = fh.read(entries_size + fh.fmt_size('Q'))
+
+    def tag_at(i):
+        return fh.unpack_fmt_from('H', buf, entry_size * i)
+
+    # Tags are supposed to be sorted, so binary search
+    lo, hi = 0, tag_count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if tag_at(mid) < tag:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo == tag_count or tag_at(lo) != tag:
+        # Not found; maybe the directory is unsorted
+        for lo in range(tag_count):
+            if tag_at(lo) == tag:
+                break
+        else:
+            raise IOError('No such tag')
+
+    # Delete it by shifting the rest of the directory down in place
+    mm = mmap.mmap(fh.fileno(), 0)
+    try:
+        pos = entries_base + entry_size * lo
+        mm.move(pos, pos + entry_size, len(buf) - entry_size * (lo + 1))
+        fh.pack_fmt_into('Y', mm, dir_base, tag_count - 1)
+        mm.flush()
+    finally:
+        mm.close()
@@ -1,19 +1,20 @@
-import struct
+import numpy as np
 import sys
 
-jpeg = 0
-last = float('inf')
+RECORD = np.dtype([('offset', '<i8'), ('pad', 'V32')])
 
-with open(sys.argv[1]) as fh:
-    while True:
-        buf = fh.read(40)
-        if not buf:
-            break
-        val = struct.unpack('<q32x', buf)[0]
+offsets = np.fromfile(sys.argv[1], dtype=RECORD)['offset']
+# Each JPEG's offsets start over from a lower value
+breaks = np.concatenate(([0], np.flatnonzero(np.diff(offsets) < 0) + 1,
+        [len(offsets)])).tolist()
 
-        if val < last:
-            print '=====', jpeg
-            jpeg += 1
-        last = val
 
-        print val
+def format_lines():
+    for jpeg, (start, end) in enumerate(zip(breaks, breaks[1:])):
+        if start < end:
+            yield '===== %d\n' % jpeg
+        for val in offsets[start:end].tolist():
+            yield '%d\n' % val
+
+
+sys.stdout.writelines(format_lines())
@@ -1,58 +1,61 @@
+import mmap
+import numpy as np
+import os
 import struct
 import sys
 
+MARKER = struct.Struct('2B')
+SEGMENT_LENGTH = struct.Struct('>H')
+
+# Bytes of entropy-coded data to scan at once
+SCAN_WINDOW = 32 << 20
+
 class EOFError(Exception):
     pass
 
 
-def decode(fh, fmt):
-    count = struct.calcsize(fmt)
-    buf = fh.read(count)
-    if not buf:
+def decode(buf, off, fmt):
+    if off >= len(buf):
         raise EOFError
-    elif len(buf) < count:
+    elif off + fmt.size > len(buf):
         raise IOError('Short read')
-    return struct.unpack(fmt, buf)
+    return fmt.unpack_from(buf, off)
 
 
-with open(sys.argv[1]) as fh:
+with open(sys.argv[1], 'rb') as fh:
+    if os.fstat(fh.fileno()).st_size:
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        # mmap can't map an empty file; let decode() report EOF
+        mm = b''
+    off = 0
     try:
         # Walk header
         marker_byte = 0
         while marker_byte != 0xda:  # SOS
-            flag, marker_byte = decode(fh, '2B')
+            flag, marker_byte = decode(mm, off, MARKER)
             if flag != 0xff:
                 raise ValueError('Expected marker, found something else')
+            off += MARKER.size
             if marker_byte == 0xd8:
                 # SOI; no marker segment
                 continue
-            count = decode(fh, '>H')[0]
-            fh.seek(count - 2, 1)
-
-        # Walk entropy-coded data
-        base = fh.tell()
-        print base
-        while True:
-            buf = fh.read(4 << 10)
-            if not buf:
-                break
-            off = 0
-            while True:
-                off = buf.find('\xff', off)
-                if off == -1:
-                    break
-                elif off == len(buf) - 1:
-                    ch = fh.read(1)
-                    if len(ch) != 1:
-                        raise IOError('Short read')
-                    buf += ch
-                marker_byte = struct.unpack('B', buf[off + 1])[0]
-                if marker_byte >= 0xd0 and marker_byte <= 0xd7:
-                    print base + off + 2
-                off += 2
-            base += len(buf)
+            off += decode(mm, off, SEGMENT_LENGTH)[0]
+
+        # Walk entropy-coded data, looking for RST markers
+        base = off
+        print(base)
+        for start in range(base, len(mm) - 1, SCAN_WINDOW):
+            # Overlap by one byte to see the byte after a trailing 0xff
+            end = min(start + SCAN_WINDOW + 1, len(mm))
+            data = np.frombuffer(mm, dtype=np.uint8, count=end - start,
+                    offset=start)
+            ff = np.flatnonzero(data[:-1] == 0xff)
+            marker_byte = data[ff + 1]
+            rst = ff[(marker_byte >= 0xd0) & (marker_byte <= 0xd7)]
+            np.savetxt(sys.stdout, rst + start + 2, fmt='%d')
     except EOFError:
         pass
     except Exception:
-        print 'At {}:'.format(fh.tell())
+        print('At {}:'.format(off))
         raise
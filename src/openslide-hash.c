@@ -29,6 +29,9 @@
 #include <string.h>
 #include <glib.h>
 
+// feed the checksum in large chunks to amortize per-update overhead
+#define HASH_BUFSIZE (1 << 20)
+
 struct _openslide_hash {
   GChecksum *checksum;
   bool enabled;
@@ -63,6 +66,8 @@ bool _openslide_hash_file_part(struct _openslide_hash *hash,
 			       const char *filename,
 			       int64_t offset, int64_t size,
 			       GError **err) {
+  uint8_t *buf = NULL;
+  int64_t buflen = 0;
   bool success = false;
 
   FILE *f = _openslide_fopen(filename, "rb", err);
@@ -84,7 +89,9 @@ bool _openslide_hash_file_part(struct _openslide_hash *hash,
     size = len - offset;
   }
 
-  uint8_t buf[4096];
+  // don't allocate the full buffer for small ranges
+  buflen = CLAMP(size, 0, (int64_t) HASH_BUFSIZE);
+  buf = g_slice_alloc(buflen);
 
   if (fseeko(f, offset, SEEK_SET) == -1) {
     _openslide_io_error(err, "Can't seek in %s", filename);
@@ -93,7 +100,7 @@ bool _openslide_hash_file_part(struct _openslide_hash *hash,
 
   int64_t bytes_left = size;
   while (bytes_left > 0) {
-    int64_t bytes_to_read = MIN((int64_t) sizeof buf, bytes_left);
+    int64_t bytes_to_read = MIN(buflen, bytes_left);
     int64_t bytes_read = fread(buf, 1, bytes_to_read, f);
 
     if (bytes_read != bytes_to_read) {
@@ -112,6 +119,9 @@ bool _openslide_hash_file_part(struct _openslide_hash *hash,
   success = true;
 
 DONE:
+  if (buf) {
+    g_slice_free1(buflen, buf);
+  }
   fclose(f);
   return success;
 }